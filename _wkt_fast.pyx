@@ -0,0 +1,78 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled versions of the per-vertex helpers of dxf_entity_to_wkt in utils.py.
+Optional, utils.py keeps its own NumPy versions for when this isn't built, see setup.py.
+The arithmetic follows those versions step by step so both give the same coordinates,
+except ellipse_points, see there.
+"""
+import numpy as np
+from libc.math cimport cos, sin, M_PI
+
+def xy_points(points):
+    """Returns the x, y of a sequence of Vec points as an (N, 2) array"""
+    cdef list items = list(points)
+    cdef Py_ssize_t i, n = len(items)
+    out = np.empty((n, 2))
+    cdef double[:, ::1] view = out
+    for i in range(n):
+        point = items[i]
+        view[i, 0] = point.x
+        view[i, 1] = point.y
+    return out
+
+def vertex_locations(vertices):
+    """Returns the x, y of the locations of POLYLINE vertices as an (N, 2) array"""
+    cdef list items = list(vertices)
+    cdef Py_ssize_t i, n = len(items)
+    out = np.empty((n, 2))
+    cdef double[:, ::1] view = out
+    for i in range(n):
+        location = items[i].dxf.location
+        view[i, 0] = location.x
+        view[i, 1] = location.y
+    return out
+
+def arc_points(double cx, double cy, double radius, double start_angle, double angle_span, Py_ssize_t num_segments):
+    """Returns num_segments + 1 points along an arc in degrees, with the center as an extra last row"""
+    out = np.empty((num_segments + 2, 2))
+    cdef double[:, ::1] view = out
+    cdef double angle
+    cdef Py_ssize_t i
+    for i in range(num_segments + 1):
+        angle = (start_angle + angle_span * i / num_segments) * (M_PI / 180.0)
+        view[i, 0] = cx + radius * cos(angle)
+        view[i, 1] = cy + radius * sin(angle)
+    view[num_segments + 1, 0] = cx
+    view[num_segments + 1, 1] = cy
+    return out
+
+def circle_points(const double[:, ::1] unit_circle, double cx, double cy, double radius):
+    """Returns the scaled and moved unit circle points, with the center as an extra last row"""
+    cdef Py_ssize_t i, n = unit_circle.shape[0]
+    out = np.empty((n + 1, 2))
+    cdef double[:, ::1] view = out
+    for i in range(n):
+        view[i, 0] = radius * unit_circle[i, 0] + cx
+        view[i, 1] = radius * unit_circle[i, 1] + cy
+    view[n, 0] = cx
+    view[n, 1] = cy
+    return out
+
+def ellipse_points(const double[:, ::1] unit_circle, double cx, double cy, double a, double b, double cos_r, double sin_r):
+    """
+    Returns the scaled, rotated and moved unit circle points, with the center as an extra last row.
+    The NumPy version rotates with @, which OpenBLAS may evaluate with fused multiply-adds,
+    so the two can differ in the last bits.
+    """
+    cdef Py_ssize_t i, n = unit_circle.shape[0]
+    out = np.empty((n + 1, 2))
+    cdef double[:, ::1] view = out
+    cdef double x, y
+    for i in range(n):
+        x = unit_circle[i, 0] * a
+        y = unit_circle[i, 1] * b
+        view[i, 0] = (x * cos_r + y * -sin_r) + cx
+        view[i, 1] = (x * sin_r + y * cos_r) + cy
+    view[n, 0] = cx
+    view[n, 1] = cy
+    return out
@@ -1,7 +1,18 @@
+import asyncio
+import json
 from pathlib import Path
 import mimetypes
-from time import time
+import threading
 import httpx
+import orjson
+
+# Clients are shared per server and credentials, so new Wistor instances reuse the
+# open HTTP/2 connection and the login cookie instead of handshaking again
+_CLIENTS: dict[tuple[str, str, str, str], httpx.Client] = {}
+# Keys of the clients whose last login was accepted, only those skip the login
+_LOGGED_IN: set[tuple[str, str, str, str]] = set()
+# Streamlit runs every session on its own thread
+_CLIENTS_LOCK = threading.Lock()
 
 class Wistor:
     def __init__(self, repo:str, login:str, psw:str, viewer: str | None = None, cgi: str | None = None) -> None:
@@ -9,46 +20,128 @@ class Wistor:
         self.login = login
         self.psw = psw
         self.viewer_path = viewer
-        self.session_x = httpx.Client(http2=True)
         self.cgi = cgi or 'https://app.wistor.nl/servlets/cgi/'
+        self.client_key = (self.cgi, self.repo, self.login, self.psw)
+        with _CLIENTS_LOCK:
+            if self.client_key not in _CLIENTS:
+                _CLIENTS[self.client_key] = httpx.Client(http2=True, limits=httpx.Limits(max_keepalive_connections=10))
+            self.session_x = _CLIENTS[self.client_key]
         self.repo_uri = f'{self.cgi}login/{self.repo}'
         self.rule_uri = f'{self.cgi}command/{self.repo}'
         self.download_uri = f'{self.cgi}download/{self.repo}/'
         self.query_uri =  f'{self.cgi}sparql/{self.repo}'
         self.upload_uri = f'{self.cgi}upload/{self.repo}'
         self.is_logged_in_uri = f'{self.cgi}isloggedin/{self.repo}?viewerPath={self.viewer_path}'
-        self.start_session()
+        # A shared client that logged in successfully is reused as it is, an
+        # expired session is noticed on the next request and logged in again there
+        if self.client_key not in _LOGGED_IN:
+            self.start_session()
 
     def start_session(self) -> None:
+        with _CLIENTS_LOCK:
+            _LOGGED_IN.discard(self.client_key)
         res_2 = self.session_x.post(self.repo_uri,json={"login":self.login,"psw":self.psw},timeout=10)
-        print(res_2.json())
+        try:
+            answer = orjson.loads(res_2.content)
+        except orjson.JSONDecodeError:
+            answer = None
+        print(answer)
 
-    def execute_rule(self, rule:str, parameters:dict|None, debug_mode:bool = False) -> dict | None:
-        message = {
+        # The login servlet answers {"loggedIn": "TRUE", ...} once the credentials are
+        # accepted, a session cookie alone is handed out to anyone
+        if not (res_2.is_success and isinstance(answer, dict) and answer.get('loggedIn') == 'TRUE'):
+            raise PermissionError(f"Logging in to Wistor repo {self.repo} as {self.login} failed: {answer or res_2.status_code}")
+        with _CLIENTS_LOCK:
+            _LOGGED_IN.add(self.client_key)
+
+    @staticmethod
+    def _session_expired(response: httpx.Response) -> bool:
+        # Without a valid session the servlets answer 401/403 or redirect to the login page
+        return response.status_code in (401, 403) or response.is_redirect
+
+    def _json_answer(self, response: httpx.Response):
+        """The parsed answer of a JSON servlet, or None when the session had expired"""
+        if self._session_expired(response):
+            return None
+        try:
+            answer = orjson.loads(response.content)
+        except orjson.JSONDecodeError:
+            response.raise_for_status()
+            # A 200 that isn't JSON is the login page served in place of the answer
+            return None
+        # Or the servlet answers 200 with the login state instead of a result
+        if isinstance(answer, dict) and answer.get('loggedIn') == 'FALSE':
+            return None
+        return answer
+
+    @staticmethod
+    def _retried_answer(response: httpx.Response):
+        """The parsed answer of a request resent after logging in again, errors are raised as they are"""
+        response.raise_for_status()
+        return orjson.loads(response.content)
+
+    def _send(self, method: str, url: str, **kwargs) -> httpx.Response:
+        response = self.session_x.request(method, url, **kwargs)
+        if self._session_expired(response):
+            self.start_session()
+            response = self.session_x.request(method, url, **kwargs)
+        return response
+
+    def _send_json(self, method: str, url: str, **kwargs):
+        answer = self._json_answer(self.session_x.request(method, url, **kwargs))
+        if answer is None:
+            self.start_session()
+            answer = self._retried_answer(self.session_x.request(method, url, **kwargs))
+        return answer
+
+    def rule_message(self, rule:str, parameters:dict|None, debug_mode:bool = False) -> dict:
+        return {
             "commando":"VRCommands",
             "command2":"runSparqlRulesWithTag",
             "command3":rule,
-            "parameters":str(parameters),
+            "parameters":json.dumps(parameters, ensure_ascii=False),
             "debugMode": debug_mode
         }
-        response = self.session_x.post(self.rule_uri,json=message, timeout=120)
-        return response.json()
+
+    def execute_rule(self, rule:str, parameters:dict|None, debug_mode:bool = False) -> dict | None:
+        message = self.rule_message(rule, parameters, debug_mode)
+        return self._send_json('POST', self.rule_uri,json=message, timeout=120)
+
+    async def execute_rules(self, rules:list[tuple[str, dict|None]], debug_mode:bool = False) -> list[dict]:
+        # All rules are sent at once as parallel streams on one HTTP/2 connection,
+        # e.g. results = asyncio.run(wistor.execute_rules([(rule, parameters), ...]))
+        messages = [self.rule_message(rule, parameters, debug_mode) for rule, parameters in rules]
+        answers = [self._json_answer(response) for response in await self._post_rules(messages)]
+
+        # Log in again once and resend only the rules that hit an expired session
+        expired = [i for i, answer in enumerate(answers) if answer is None]
+        if expired:
+            self.start_session()
+            retried = await self._post_rules([messages[i] for i in expired])
+            for i, response in zip(expired, retried):
+                answers[i] = self._retried_answer(response)
+        return answers
+
+    async def _post_rules(self, messages:list[dict]) -> list[httpx.Response]:
+        async with httpx.AsyncClient(http2=True, cookies=self.session_x.cookies) as client:
+            return list(await asyncio.gather(*[client.post(self.rule_uri, json=message, timeout=120) for message in messages]))
     
     def download_file(self, filename:str):
-        response = self.session_x.get(f'{self.download_uri}{filename}',timeout=60)
+        response = self._send('GET', f'{self.download_uri}{filename}',timeout=60)
         return response.content
     
-    def query(self, query:str, infer:bool = False, same_as:bool = False) -> dict:
+    def query(self, query:str, infer:bool = False, same_as:bool = False, fresh:bool = False) -> dict:
         message = {
             'infer': infer,
             'sameAs': same_as,
-            'query': f'{query}#{time()}'
+            'query': query
         }
         headers = {
             'Content-Type': 'application/x-www-form-urlencoded'
         }
-        response = self.session_x.post(self.query_uri,data=message, headers=headers)
-        return response.json()
+        if fresh:
+            headers['Cache-Control'] = 'no-cache'
+        return self._send_json('POST', self.query_uri,data=message, headers=headers)
     
     def download_last_file(
             self, 
@@ -68,7 +161,7 @@ class Wistor:
                 ORDER BY DESC(?dateTime)
                 LIMIT 1
         """
-        answer = self.query(query)
+        answer = self.query(query, fresh=True)
         file_name = answer['results']['bindings'][0]['filename']['value']
         file = self.download_file(file_name)
         if destination:
@@ -82,12 +175,19 @@ class Wistor:
             parameters = {}
         parameters['command'] = rule_tag
 
-        file = {'file':(Path(source).name, open(source, 'rb'), mimetypes.guess_type(source)[0])}
-        
-        response = self.session_x.post(self.upload_uri,data=parameters,files=file, timeout=6000)
+        # httpx reads file objects in chunks while sending the multipart body,
+        # so the upload is streamed from disk and the handle closed afterwards
+        with open(source, 'rb') as f:
+            file = {'file':(Path(source).name, f, mimetypes.guess_type(source)[0])}
+            response = self.session_x.post(self.upload_uri,data=parameters,files=file, timeout=6000)
+            if self._session_expired(response):
+                # The first attempt read the file, send it again from the start
+                self.start_session()
+                f.seek(0)
+                response = self.session_x.post(self.upload_uri,data=parameters,files=file, timeout=6000)
         return response
 
 
     def is_logged_in(self):
         response = self.session_x.get(self.is_logged_in_uri)
-        return response
\ No newline at end of file
+        return response
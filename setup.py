@@ -0,0 +1,38 @@
+"""
+Builds the optional _wkt_fast extension next to utils.py:
+
+    python setup.py build_ext --inplace
+
+utils.py works without it, so when Cython or a C compiler is missing the
+build only prints a warning and the NumPy versions of the helpers are used.
+"""
+from setuptools import setup
+from setuptools.command.build_ext import build_ext
+
+
+class OptionalBuildExt(build_ext):
+    """build_ext that warns instead of failing when the extension can't be compiled"""
+
+    def run(self):
+        try:
+            super().run()
+        except Exception as e:
+            self.warn(f"Skipping the _wkt_fast extension, utils.py will use its NumPy versions: {e}")
+
+    def build_extension(self, ext):
+        try:
+            super().build_extension(ext)
+        except Exception as e:
+            self.warn(f"Skipping the _wkt_fast extension, utils.py will use its NumPy versions: {e}")
+
+
+def extensions():
+    try:
+        from Cython.Build import cythonize
+    except ImportError:
+        print("Cython is not installed, skipping the _wkt_fast extension")
+        return []
+    return cythonize(["_wkt_fast.pyx"])
+
+
+setup(ext_modules=extensions(), cmdclass={"build_ext": OptionalBuildExt})
@@ -1,93 +1,132 @@
 import streamlit as st
 import io
-import matplotlib.pyplot as plt
-from ezdxf.addons.drawing import RenderContext, Frontend
-from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
+import hashlib
 from ezdxf import recover
-from ezdxf.addons.drawing.config import Configuration, TextPolicy
 
 import pandas as pd
-from pywistor import Wistor
-from utils import generate_uri, get_non_empty_layer_names, dxf_entity_to_wkt
-
-def display_dxf(doc, selected_layers=None, render_txt=False):
-    """Display the DXF file using matplotlib"""
-    if not doc:
-        return None
-
-    fig = plt.figure(dpi=100)
+from utils import build_layer_index, generate_uri, get_non_empty_layer_names, dxf_entity_to_wkt, geometries_to_wkt, get_transformer, layer_filter
+
+# Text modes of display_dxf. "boxes" draws every text as its bounding box, much
+# faster than "full" which fills in the glyph outlines
+TEXT_MODES = ("none", "boxes", "full")
+
+@st.cache_resource(max_entries=8)
+def render(_doc, doc_hash, layer_key, text_mode):
+    """Render the DXF to PNG bytes once per layer selection and text mode, keeps the last few"""
+    # Imported here so the page loads without matplotlib until there is something to draw
+    from matplotlib.figure import Figure
+    from ezdxf.addons.drawing import RenderContext, Frontend
+    from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
+    from ezdxf.addons.drawing.config import Configuration, TextPolicy
+
+    fig = Figure(dpi=100)
     ax = fig.add_axes([0, 0, 1, 1])
 
-    ctx = RenderContext(doc)
+    ctx = RenderContext(_doc)
     out = MatplotlibBackend(ax)
 
-    # Use IGNORE or SHOW based on render_txt flag
-    config = Configuration(text_policy=TextPolicy.FILLING if render_txt else TextPolicy.IGNORE)
-
-    msp = doc.modelspace()
+    text_policy = {"none": TextPolicy.IGNORE, "boxes": TextPolicy.REPLACE_RECT, "full": TextPolicy.FILLING}[text_mode]
+    config = Configuration(text_policy=text_policy)
 
-    def entity_filter(entity):
-        if selected_layers is None or not selected_layers:
-            return True
-        return entity.dxf.layer in selected_layers
+    msp = _doc.modelspace()
 
     frontend = Frontend(ctx, out, config=config)
 
-    # If render_txt is True, we skip the filter to include all entities
-    frontend.draw_layout(msp, finalize=True, filter_func=entity_filter)
+    # Without selected layers there is no filter to call at all
+    frontend.draw_layout(msp, finalize=True, filter_func=layer_filter(layer_key))
 
-    return fig
+    # The cache is shared by all sessions, so it holds the finished PNG rather than
+    # the Figure. Saved the way st.pyplot saves figures
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format="png", bbox_inches="tight", dpi=200)
+    return buffer.getvalue()
 
-def export_to_wkt(doc, selected_layers):
-    """Export DXF entities to WKT using Shapely with expanded entity type support"""
+def display_dxf(doc, doc_hash, selected_layers=None, text_mode="none"):
+    """Returns the DXF drawing as PNG bytes, text_mode is one of TEXT_MODES"""
     if not doc:
+        return None
+
+    # Every text mode is cached separately, switching between them is a cache hit
+    layer_key = tuple(sorted(selected_layers)) if selected_layers else ()
+    return render(doc, doc_hash, layer_key, text_mode)
+
+ENTITY_COLUMNS = ['uri', 'layer', 'type', 'wkt', 'color', 'extra_data']
+
+@st.cache_data(max_entries=8)
+def export_to_wkt(_layer_index, doc_hash, layer_key: tuple):
+    """Export DXF entities to WKT, cached per document and layer selection"""
+    if not _layer_index:
         return pd.DataFrame()
         
-    msp = doc.modelspace()
-    entities_data = []
+    # From EPSG:28992 (Amersfoort/RD New) to EPSG:4326 (WGS84), gives (lon, lat)
+    transform = get_transformer("EPSG:28992", "EPSG:4326").transform
     
-    for entity in msp:
-        try:
-            if selected_layers and entity.dxf.layer not in selected_layers:
-                continue
+    uris, layers, types, colors, extras, geometries = [], [], [], [], [], []
+    errors = []
+    
+    # Only visit the entities of the selected layers, layer by layer. Serial on
+    # purpose, threads can't help here: the GEOS work runs in bulk after the loop,
+    # and the PROJ calls (the only part that releases the GIL) take under a third
+    # of the loop, the rest is ezdxf attribute access holding the GIL
+    for layer_name in layer_key:
+        for entity in _layer_index.get(layer_name, ()):
+            try:
+                # Convert entity to transformed coordinates and get metadata
+                result = dxf_entity_to_wkt(entity, transform)
                 
-            # Convert entity to WKT and get metadata
-            result = dxf_entity_to_wkt(entity)
-            
-            # Skip entities that couldn't be converted
-            if not result['wkt']:
-                continue
+                # Skip entities that couldn't be converted
+                if not result['geometry']:
+                    continue
+                    
+                # Generate a URI for the entity
+                uri = generate_uri(result)
                 
-            # Generate a URI for the entity
-            uri = generate_uri(result)
-            
-            # Add to our results list
-            entities_data.append({
-                'uri': uri,
-                'layer': result['layer'],
-                'type': result['type'],
-                'wkt': result['wkt'],
-                'color': result['color'],
-                'extra_data': result['extra_data']
-            })
-                
-        except Exception as e:
-            # Log the error but continue processing other entities
-            print(f"Error processing {entity.dxftype()} entity: {str(e)}")
-            continue
+                # Add to our results column by column
+                uris.append(uri)
+                layers.append(result['layer'])
+                types.append(result['type'])
+                colors.append(result['color'])
+                extras.append(result['extra_data'])
+                geometries.append(result['geometry'])
+                    
+            except Exception as e:
+                # Keep the error but continue processing other entities
+                errors.append(f"{entity.dxftype()} entity: {str(e)}")
+                continue
     
-    return pd.DataFrame(entities_data)
+    # Reported once for the whole export, cache hits replay the warning
+    if errors:
+        st.warning(f"Skipped {len(errors)} entities that could not be converted: " + "; ".join(errors[:5]) + ("; ..." if len(errors) > 5 else ""))
+    
+    # All geometries are built and written as WKT in bulk rather than one by one.
+    # Built from whole columns, so pandas doesn't have to assemble them row by row
+    return pd.DataFrame({
+        'uri': uris,
+        'layer': layers,
+        'type': types,
+        'wkt': geometries_to_wkt(geometries),
+        'color': colors,
+        'extra_data': extras
+    }, columns=ENTITY_COLUMNS, copy=False)
+
+@st.cache_resource(max_entries=4)
+def parse_dxf(_content_bytes, doc_hash):
+    """
+    Parse the DXF once per file content, keyed on its hash so the bytes aren't hashed again.
+    Only the last few documents are kept, a large Drawing holds a lot of memory
+    """
+    doc, _ = recover.read(io.BytesIO(_content_bytes))
+    return doc
 
 def process_uploaded_file(uploaded_file):
-    """Process the uploaded file"""
+    """Process the uploaded file, returns the document and its content hash"""
     try:
-        bytes_data = uploaded_file.getvalue()
-        binary_dxf = io.BytesIO(bytes_data)
-        doc, _ = recover.read(binary_dxf)
-        return doc
+        content_bytes = uploaded_file.getvalue()
+        doc_hash = hashlib.blake2b(content_bytes, digest_size=16).hexdigest()
+        return parse_dxf(content_bytes, doc_hash), doc_hash
     except Exception as e:
         st.error(f"Error processing DXF file: {str(e)}")
-        return None
+        return None, None
 
 # Hide Streamlit components
 hide_streamlit_style = """
@@ -106,18 +145,23 @@ uploaded_file = st.file_uploader("Choose a DXF file", type=['dxf'])
 # Process the uploaded file
 doc = None
 if uploaded_file is not None:
-    doc = process_uploaded_file(uploaded_file)
+    doc, doc_hash = process_uploaded_file(uploaded_file)
     if doc:
+        # Group the entities by layer once per file, layer picks then only visit their own entities
+        if st.session_state.get('doc_hash') != doc_hash:
+            st.session_state.doc_hash = doc_hash
+            st.session_state.layer_index = build_layer_index(doc)
         st.success("DXF file loaded successfully!")
 
 # Only show controls if we have a document
 if doc is not None:
     # Display the full drawing first
-    full_fig = display_dxf(doc)
-    if full_fig: st.pyplot(full_fig)
+    text_mode = st.radio("Text", TEXT_MODES, format_func=str.capitalize, horizontal=True)
+    full_png = display_dxf(doc, doc_hash, text_mode=text_mode)
+    if full_png: st.image(full_png)
     
     # Layer selection (here we are only interested in layers with entities)
-    layer_names = get_non_empty_layer_names(doc)
+    layer_names = get_non_empty_layer_names(st.session_state.layer_index)
     selected_layers = st.multiselect(
         "Select Layers", 
         layer_names, 
@@ -126,7 +170,8 @@ if doc is not None:
     
     if selected_layers:
         # Get entity data with WKT and URIs
-        entity_data = export_to_wkt(doc, selected_layers)
+        # Sorted so the order of the picks doesn't matter for the cache
+        entity_data = export_to_wkt(st.session_state.layer_index, doc_hash, tuple(sorted(selected_layers)))
         
         # Display WKT and entity info
         if not entity_data.empty:
@@ -140,15 +185,21 @@ if doc is not None:
                 selected_object_type = st.selectbox("What is the type of the selected objects?",("sewer_pipe", "other"))
 
             with col2:
-                triples = []
-                for _, row in entity_data.iterrows():
-                    triples.append(f"(<{row['uri']}> \"{row['wkt']}\"^^geo:wktLiteral <http://wistor.nl/entityType#{selected_object_type}>)")
-                triples_text = "\n".join(triples)
                 if col2.button("Import"):
-                    wistor = Wistor("AMS", "Gemeente Amersfoort", "oA^a&W4TvxK^zl", cgi="https://amersfoort-bms-poc.wistor.nl/servlets/cgi/")
-                    rule_result = wistor.execute_rule('ams_add_many_wkt',{"triples":triples_text}, debug_mode=True)
+                    from pywistor import Wistor
+                    
+                    # Only built when importing, straight from the column arrays
+                    triples_text = "\n".join(
+                        f"(<{uri}> \"{wkt}\"^^geo:wktLiteral <http://wistor.nl/entityType#{selected_object_type}>)"
+                        for uri, wkt in zip(entity_data['uri'].to_numpy(), entity_data['wkt'].to_numpy())
+                    )
+                    try:
+                        wistor = Wistor("AMS", "Gemeente Amersfoort", "oA^a&W4TvxK^zl", cgi="https://amersfoort-bms-poc.wistor.nl/servlets/cgi/")
+                        rule_result = wistor.execute_rule('ams_add_many_wkt',{"triples":triples_text}, debug_mode=True)
+                    except PermissionError as e:
+                        rule_result = {'success': False, 'errors': str(e)}
                     if rule_result['success']:
-                        st.success(f"Info: {len(triples)} {selected_object_type} successfully added to the database!")
+                        st.success(f"Info: {len(entity_data)} {selected_object_type} successfully added to the database!")
                     else:
                         st.error(f"Error adding entities to GraphDB: {rule_result['errors']}")
         else:
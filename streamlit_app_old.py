@@ -1,11 +1,13 @@
 #streamlit run streamlit_app.py --server.enableXsrfProtection=false
 import streamlit as st
 import io
-import matplotlib.pyplot as plt
-from ezdxf.addons.drawing import RenderContext, Frontend
-from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
+import hashlib
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 from ezdxf import recover
-from ezdxf.addons.drawing.config import Configuration, TextPolicy
+from utils import build_layer_index, format_coords_ragged, layer_filter
 #from pywistor import Wistor
 
 # Initialize session state variables
@@ -13,81 +15,219 @@ if 'doc' not in st.session_state:
     st.session_state.doc = None
 if 'layer_names' not in st.session_state:
     st.session_state.layer_names = []
-if 'wkt_cache' not in st.session_state:
-    st.session_state.wkt_cache = {}
-
-@st.cache_data
-def display_dxf_without_text(doc_id, selected_layers=None):
-    """Cache the DXF rendering to avoid recomputation"""
-    doc = st.session_state.doc
-    if not doc:
-        return None
-        
-    fig = plt.figure(dpi=100)
+
+@st.cache_resource
+def drawing_view(_doc, doc_id):
+    """Cache the view shared by all layer renders so they can be composited"""
+    # The drawing modules are imported where they are used, so the page
+    # loads without matplotlib until a file is uploaded
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import to_rgba
+    from ezdxf import bbox
+    from ezdxf.addons.drawing.properties import LayoutProperties
+
+    msp = _doc.modelspace()
+
+    # Every layer is drawn into the same extents and figure size, so the
+    # rasterized layers line up pixel for pixel
+    extents = bbox.extents(msp, fast=True)
+    if extents.has_data and extents.size.x > 0:
+        limits = ((extents.extmin.x, extents.extmax.x), (extents.extmin.y, extents.extmax.y))
+        figsize = plt.figaspect(extents.size.y / extents.size.x)
+    else:
+        limits = None
+        figsize = None
+
+    background = to_rgba(LayoutProperties.from_layout(msp).background_color)
+    return limits, figsize, background
+
+@st.cache_resource
+def render_executor():
+    """Thread pool shared by all sessions for rendering layers in the background"""
+    return ThreadPoolExecutor(max_workers=2)
+
+def draw_layer(doc, limits, figsize, layer_name):
+    """Render a single layer into a transparent RGBA image"""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from ezdxf.addons.drawing import RenderContext, Frontend
+    from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
+    from ezdxf.addons.drawing.config import Configuration, TextPolicy
+
+    # No pyplot here, this runs on the render threads
+    fig = Figure(figsize=figsize, dpi=100)
+    canvas = FigureCanvasAgg(fig)
     ax = fig.add_axes([0, 0, 1, 1])
-    
+
+    out = MatplotlibBackend(ax, adjust_figure=False)
+    config = Configuration(text_policy=TextPolicy.IGNORE)
+
     ctx = RenderContext(doc)
+    frontend = Frontend(ctx, out, config=config)
+    frontend.draw_layout(doc.modelspace(), finalize=True, filter_func=layer_filter((layer_name,)))
+
+    if limits:
+        ax.set_xlim(*limits[0])
+        ax.set_ylim(*limits[1])
+
+    # Drop the background so layers can be stacked on top of each other
+    fig.patch.set_alpha(0)
+    ax.patch.set_alpha(0)
+
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba()).copy()
+
+class LayerRenders:
+    """The background layer renders of one document"""
+
+    def __init__(self):
+        self.futures = {}
+        self.lock = threading.Lock()
+
+@st.cache_resource(max_entries=4)
+def layer_renders(_doc, doc_id):
+    """Only the last few documents keep their layer renders"""
+    return LayerRenders()
+
+def render_layer(doc, doc_id, layer_name):
+    """Start rendering a layer once in the background, returns a future of its image"""
+    renders = layer_renders(doc, doc_id)
+    with renders.lock:
+        future = renders.futures.get(layer_name)
+        if future is not None:
+            return future
+        limits, figsize, _ = drawing_view(doc, doc_id)
+        future = render_executor().submit(draw_layer, doc, limits, figsize, layer_name)
+        renders.futures[layer_name] = future
+
+    # Outside the lock, a render that already finished runs the callback right away
+    future.add_done_callback(lambda done: forget_failed_render(renders, layer_name, done))
+    return future
+
+def forget_failed_render(renders, layer_name, future):
+    """Drop a failed render so the next rerun tries the layer again"""
+    if future.exception() is not None:
+        with renders.lock:
+            if renders.futures.get(layer_name) is future:
+                del renders.futures[layer_name]
+
+@st.cache_resource(max_entries=8)
+def display_dxf_without_text(_doc, doc_id, layer_key: tuple):
+    """Composite the cached layer renders instead of redrawing the DXF"""
+    if not _doc:
+        return None
+
+    # Usually these are already done, all layers are submitted at upload time
+    layers = [render_layer(_doc, doc_id, layer_name).result() for layer_name in layer_key]
+    if not layers:
+        return None
+
+    # Alpha-composite the layers over the drawing background
+    _, _, background = drawing_view(_doc, doc_id)
+    image = np.empty(layers[0].shape[:2] + (3,))
+    image[...] = background[:3]
+    for layer in layers:
+        alpha = layer[..., 3:] / 255.0
+        image = layer[..., :3] / 255.0 * alpha + image * (1.0 - alpha)
+
+    return (image * 255).astype(np.uint8)
+
+def render_png(doc):
+    """Render the full drawing once to PNG bytes"""
+    from matplotlib.figure import Figure
+    from ezdxf.addons.drawing import RenderContext, Frontend
+    from ezdxf.addons.drawing.matplotlib import MatplotlibBackend
+    from ezdxf.addons.drawing.config import Configuration, TextPolicy
+
+    # A plain Figure rather than pyplot, every render makes its own figure so
+    # none is shared with the render threads
+    fig = Figure(dpi=100)
+    ax = fig.add_axes([0, 0, 1, 1])
+
     out = MatplotlibBackend(ax)
     config = Configuration(text_policy=TextPolicy.IGNORE)
-    
-    # Get the modelspace
-    msp = doc.modelspace()
-    
-    # Create a filter function to select entities based on layer
-    def entity_filter(entity):
-        if selected_layers is None or not selected_layers:
-            return True  # If no layers are specified, include all entities
-        return entity.dxf.layer in selected_layers
-    
-    # Draw the layout with the filter
+
+    ctx = RenderContext(doc)
     frontend = Frontend(ctx, out, config=config)
-    frontend.draw_layout(msp, finalize=True, filter_func=entity_filter)
-    
-    return fig
-
-@st.cache_data
-def export_to_wkt(doc_id, selected_layers):
-    """Cache the WKT conversion to avoid recomputation"""
-    # Check if we already computed this combination
-    cache_key = tuple(sorted(selected_layers))
-    if cache_key in st.session_state.wkt_cache:
-        return st.session_state.wkt_cache[cache_key]
-        
-    doc = st.session_state.doc
-    if not doc:
-        return []
-        
-    msp = doc.modelspace()
-    wkt_list = []
+    frontend.draw_layout(doc.modelspace(), finalize=True)
+
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', dpi=100)
+    return buffer.getvalue()
+
+# WKT text around the coordinates by geometry kind, see export_to_wkt
+LINESTRING, POLYGON, POINT = range(3)
+WKT_PREFIXES = ("LINESTRING(", "POLYGON((", "POINT(")
+WKT_SUFFIXES = (")", "))", ")")
+
+def wkt_for_layer(entities):
+    """Convert the entities of one layer to WKT text"""
+    # Collect the coordinates of all entities into flat arrays first (one
+    # geometry kind per entity, its points are xy[offsets[i]:offsets[i + 1]])
+    kinds = []
+    offsets = [0]
+    xy = []
     
-    for entity in msp:
+    for entity in entities:
         try:
-            if selected_layers and entity.dxf.layer not in selected_layers:
-                continue
+            entity_type = entity.dxftype()
+            dxf = entity.dxf
+            
+            if entity_type == 'LINE':
+                start, end = dxf.start, dxf.end
+                xy += (start.x, start.y, end.x, end.y)
+                kinds.append(LINESTRING)
                 
-            if entity.dxftype() == 'LINE':
-                wkt_list.append(f"LINESTRING({entity.dxf.start.x} {entity.dxf.start.y}, {entity.dxf.end.x} {entity.dxf.end.y})")
-                
-            elif entity.dxftype() == 'LWPOLYLINE':
-                points = entity.get_points()
-                coords = ", ".join([f"{p[0]} {p[1]}" for p in points])
+            elif entity_type == 'LWPOLYLINE':
+                points = entity.get_points('xy')
                 
                 if entity.closed and len(points) > 2:
-                    wkt_list.append(f"POLYGON(({coords}, {points[0][0]} {points[0][1]}))")
+                    points.append(points[0])
+                    kinds.append(POLYGON)
                 else:
-                    wkt_list.append(f"LINESTRING({coords})")
+                    kinds.append(LINESTRING)
+                xy.extend(itertools.chain.from_iterable(points))
                     
-            elif entity.dxftype() == 'CIRCLE':
-                center = entity.dxf.center
-                radius = entity.dxf.radius
-                wkt_list.append(f"POINT({center.x} {center.y})")
+            elif entity_type == 'CIRCLE':
+                center = dxf.center
+                xy += (center.x, center.y)
+                kinds.append(POINT)
+            
+            else:
+                continue
         except Exception as e:
             # Skip problematic entities
             continue
+        offsets.append(len(xy) // 2)
+    
+    # Then format all coordinates in one batch
+    coords = format_coords_ragged(np.array(xy, dtype=np.float64), offsets)
     
-    # Store in cache
-    st.session_state.wkt_cache[cache_key] = wkt_list
-    return wkt_list
+    # Write the pieces straight into one buffer, no intermediate string per entity
+    buffer = io.StringIO()
+    write = buffer.write
+    separator = ""
+    for kind, c in zip(kinds, coords):
+        write(separator)
+        write(WKT_PREFIXES[kind])
+        write(c)
+        write(WKT_SUFFIXES[kind])
+        separator = ",\n"
+    return buffer.getvalue()
+
+@st.cache_resource(max_entries=8)
+def export_to_wkt(_layer_index, doc_id, layer_key: tuple):
+    """Cache the WKT conversion, joined into the text shown on the page"""
+    if not _layer_index:
+        return ""
+        
+    # Only visit the entities of the selected layers
+    layers = [_layer_index[layer_name] for layer_name in layer_key if layer_name in _layer_index]
+    
+    texts = [wkt_for_layer(entities) for entities in layers]
+    
+    # Joined here so reruns get the finished text from the cache
+    return ",\n".join(text for text in texts if text)
 
 def process_uploaded_file(uploaded_file):
     """Process the uploaded file and store in session state"""
@@ -103,9 +243,16 @@ def process_uploaded_file(uploaded_file):
         
         # Store in session state
         st.session_state.doc = doc
-        st.session_state.doc_id = id(doc)  # Used for caching
-        st.session_state.layer_names = [layer.dxf.name for layer in doc.layers]
-        st.session_state.wkt_cache = {}  # Clear cache on new file
+        st.session_state.doc_id = hashlib.blake2b(bytes_data, digest_size=8).hexdigest()  # Used for caching
+        st.session_state.layer_index = build_layer_index(doc)
+        st.session_state.layer_names = sorted(st.session_state.layer_index)
+        
+        # The full drawing first, so the first paint doesn't wait behind the layer renders
+        st.session_state.base_png = render_png(doc)  # The full drawing never changes for a file
+
+        # Pre-render the layers while the user is still picking them
+        for layer_name in st.session_state.layer_names:
+            render_layer(doc, st.session_state.doc_id, layer_name)
         
         return True
     except Exception as e:
@@ -161,9 +308,7 @@ if uploaded_file is not None and (not st.session_state.doc or uploaded_file.name
 # Only show controls if we have a document
 if st.session_state.doc is not None:
     # Display the full drawing first
-    full_fig = display_dxf_without_text(st.session_state.doc_id)
-    if full_fig:
-        st.pyplot(full_fig)
+    st.image(st.session_state.base_png)
     
     # Layer selection
     selected_layers = st.multiselect(
@@ -173,16 +318,16 @@ if st.session_state.doc is not None:
     )
     
     if selected_layers:
+        layer_key = tuple(sorted(selected_layers))
         col1, col2 = st.columns(2)
         
         with col1:
-            filtered_fig = display_dxf_without_text(st.session_state.doc_id, selected_layers)
-            if filtered_fig:
-                st.pyplot(filtered_fig)
+            filtered_image = display_dxf_without_text(st.session_state.doc, st.session_state.doc_id, layer_key)
+            if filtered_image is not None:
+                st.image(filtered_image)
         
         with col2:
-            wkt_strings = export_to_wkt(st.session_state.doc_id, selected_layers)
-            wkt_text = ",\n".join(wkt_strings)
+            wkt_text = export_to_wkt(st.session_state.layer_index, st.session_state.doc_id, layer_key)
             st.text_area("WKT Objects List", wkt_text, height=400)
             #wistor = Wistor("Demo", "Demo", "Demo")
             #wistor.execute_rule('ams_add_many_wkt',{"triples":'(<http://example.org/Point55> "POINT(4.9 52.3)"^^geo:wktLiteral)\n(<http://example.org/Point87> "POINT(4.8 51.4)"^^geo:wktLiteral)'},debug_mode=True)
\ No newline at end of file
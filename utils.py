@@ -1,9 +1,14 @@
-import base64
+import hashlib
 import math
-from typing import List
+import re
+from functools import lru_cache
+from typing import Dict, List
 import ezdxf
-import shapely.geometry as sg
-from pyproj import Transformer
+import numpy as np
+
+# Unit circle sampled every 10 degrees, CIRCLE and ELLIPSE outlines are scaled
+# copies of it so no entity has to evaluate cos/sin for its points
+_UNIT_CIRCLE = np.column_stack([np.cos(np.radians(np.arange(36) * 10)), np.sin(np.radians(np.arange(36) * 10))])
 
 def generate_uri(entity_data, base_uri = "http://wistor.nl/entities/"):
     """Generate a deterministic URI for a WKT entity"""
@@ -29,8 +34,8 @@ def generate_uri(entity_data, base_uri = "http://wistor.nl/entities/"):
     # Join key parts with a delimiter that won't appear in your data
     joined_parts = "||".join(key_parts)
     
-    # Base64 encode for URL safety
-    identifier = base64.urlsafe_b64encode(joined_parts.encode()).decode()
+    # Short deterministic hash, already URL safe as hex
+    identifier = hashlib.blake2b(joined_parts.encode(), digest_size=12).hexdigest()
     
     # Format URI
     clean_layer = layer.replace(' ', '_').lower()
@@ -38,290 +43,442 @@ def generate_uri(entity_data, base_uri = "http://wistor.nl/entities/"):
     
     return f"{base_uri}{clean_layer}/{clean_type}/{identifier}"
 
-def decode_uri(uri):
-    # Extract the identifier part
-    identifier = uri.split('/')[-1]
-    
-    # Decode the base64 data
-    decoded = base64.urlsafe_b64decode(identifier).decode()
-    
-    # Split back into key parts
-    key_parts = decoded.split('||')
-    
-    return key_parts
+def format_coords_ragged(points, offsets) -> List[str]:
+    """
+    Format runs of an (N, 2) array of points as WKT coordinate lists, where
+    run k is points[offsets[k]:offsets[k + 1]] (CSR layout).
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
 
-def get_non_empty_layer_names(doc: ezdxf.document.Drawing) -> List[str]:
+    # tolist() unboxes all values in one C call; this measured faster than np.char
+    coords = [f"{x} {y}" for x, y in points.tolist()]
+    offsets = np.asarray(offsets).tolist()
+    return [", ".join(coords[start:end]) for start, end in zip(offsets[:-1], offsets[1:])]
+
+def build_layer_index(doc: ezdxf.document.Drawing) -> Dict[str, list]:
     """
-    Returns list of layer names where layers contain at least one entity.
+    Returns the modelspace entities grouped by layer name, in modelspace order.
     """
-    used_layers = set()
+    return doc.modelspace().groupby(dxfattrib="layer")
 
-    for entity in doc.modelspace():
-        used_layers.add(entity.dxf.layer)
+def layer_filter(selected_layers):
+    """
+    Returns a filter function for entities on the selected layers, or None if no layers are selected.
+    """
+    if not selected_layers:
+        return None
 
-    non_empty_layer_names = sorted(used_layers)
+    # Specialised for the common single layer pick, a plain compare beats hashing
+    if len(selected_layers) == 1:
+        (layer_name,) = selected_layers
+        return lambda entity: entity.dxf.layer == layer_name
 
-    return non_empty_layer_names
+    layer_names = frozenset(selected_layers)
+    return lambda entity: entity.dxf.layer in layer_names
 
-def dxf_entity_to_wkt(entity):
-    """Convert a DXF entity to WKT format with metadata and transform coordinates"""
+def get_non_empty_layer_names(layer_index: Dict[str, list]) -> List[str]:
+    """
+    Returns list of layer names where layers contain at least one entity, from a build_layer_index() index.
+    """
+    # The index only has layers with entities, no need to scan the modelspace again
+    return sorted(layer_index)
 
-    # Create transformer from EPSG:28992 (Amersfoort/RD New) to EPSG:4326 (WGS84)
-    transformer = Transformer.from_crs("EPSG:28992", "EPSG:4326", always_xy=True)
-    
-    # Helper function to transform coordinates
-    def transform_point(x, y):
-        lon, lat = transformer.transform(x, y)
-        return lon, lat
+@lru_cache(maxsize=4)
+def get_transformer(src, dst):
+    """
+    Returns an always_xy Transformer between two CRS. Building a Transformer loads
+    PROJ data, so each one is only built once. Its .transform takes scalars or arrays.
+    """
+    # Imported on first use, pyproj is slow to import and not needed until an export
+    from pyproj import Transformer
+
+    return Transformer.from_crs(src, dst, always_xy=True)
+
+# "x,y" for the points kept in extra_data. 8 decimals is about 1 mm in degrees
+# of lon/lat, shorter than repr() and printf formatting is cheaper
+_format_point = "{:.8f},{:.8f}".format
+
+def _no_transform(x, y):
+    """Stand-in for Transformer.transform that keeps the coordinates as they are"""
+    return x, y
+
+def _transform_array(transform, points):
+    """Transform a sequence of (x, y) points in a single call, returns an (N, 2) array of (lon, lat)"""
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    return np.column_stack(transform(points[:, 0], points[:, 1]))
+
+# The NumPy versions of _xy_points and _vertex_locations return lists, turning
+# them into an array is left to the one np.asarray in _transform_array
+def _xy_points(points):
+    """Returns the x, y of a sequence of Vec points, for _transform_array"""
+    return [(point.x, point.y) for point in points]
+
+def _vertex_locations(vertices):
+    """Returns the x, y of the locations of POLYLINE vertices, for _transform_array"""
+    return [(v.dxf.location.x, v.dxf.location.y) for v in vertices]
+
+def _arc_points(cx, cy, radius, start_angle, angle_span, num_segments):
+    """Returns num_segments + 1 points along an arc in degrees, with the center as an extra last row"""
+    angles = np.radians(start_angle + angle_span * np.arange(num_segments + 1) / num_segments)
+    return np.vstack([np.column_stack([cx + radius * np.cos(angles), cy + radius * np.sin(angles)]), (cx, cy)])
+
+def _circle_points(unit_circle, cx, cy, radius):
+    """Returns the scaled and moved unit circle points, with the center as an extra last row"""
+    return np.vstack([radius * unit_circle + (cx, cy), (cx, cy)])
+
+def _ellipse_points(unit_circle, cx, cy, a, b, cos_r, sin_r):
+    """Returns the scaled, rotated and moved unit circle points, with the center as an extra last row"""
+    points = unit_circle * (a, b) @ np.array([[cos_r, sin_r], [-sin_r, cos_r]]) + (cx, cy)
+    return np.vstack([points, (cx, cy)])
+
+try:
+    # Compiled versions of the helpers above, when setup.py could build them
+    from _wkt_fast import xy_points as _xy_points, vertex_locations as _vertex_locations, arc_points as _arc_points
+    from _wkt_fast import circle_points as _circle_points, ellipse_points as _ellipse_points
+except ImportError:
+    pass
+
+def _close_ring(points):
+    """Returns the (N, 2) points with the first one repeated at the end, unless they already are closed"""
+    if np.array_equal(points[0], points[-1]):
+        return points
+    return np.vstack([points, points[:1]])
+
+# Minimum number of coordinates per geometry kind, checked per entity so a bad
+# entity can't fail the bulk construction in geometries_to_wkt
+_MIN_COORDS = {'POINT': 1, 'LINESTRING': 2, 'POLYGON': 4}
+
+def _geometry(kind, coords):
+    """Returns a (kind, coords) geometry for geometries_to_wkt, coords as an (N, 2) array"""
+    coords = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+    if len(coords) < _MIN_COORDS[kind]:
+        raise ValueError(f"A {kind} requires at least {_MIN_COORDS[kind]} coordinates, got {len(coords)}")
+    return kind, coords
+
+def _shapely_wkt(kind, parts) -> List[str]:
+    """
+    Returns the WKT of same-kind geometries, built with the vectorised Shapely
+    constructors and serialised in one call.
+    """
+    # Imported here, most exports never need Shapely
+    import shapely
+
+    if kind == 'MULTIPOLYGON':
+        # Each ring becomes a polygon, then the polygons are grouped per multipolygon,
+        # so all multipolygons are built in three calls however many rings they have
+        rings = [ring for part_rings in parts for ring in part_rings]
+        ring_indices = np.repeat(np.arange(len(rings)), [len(ring) for ring in rings])
+        polygons = shapely.polygons(shapely.linearrings(np.concatenate(rings), indices=ring_indices))
+        geoms = shapely.multipolygons(polygons, indices=np.repeat(np.arange(len(parts)), [len(part_rings) for part_rings in parts]))
+    elif kind == 'POINT':
+        geoms = shapely.points(np.concatenate(parts))
+    else:
+        # All coordinates in one array, indices tell which geometry each one belongs to
+        indices = np.repeat(np.arange(len(parts)), [len(part) for part in parts])
+        if kind == 'LINESTRING':
+            geoms = shapely.linestrings(np.concatenate(parts), indices=indices)
+        else:
+            geoms = shapely.polygons(shapely.linearrings(np.concatenate(parts), indices=indices))
+
+    # rounding_precision=-1 gives full precision, like the .wkt property
+    return shapely.to_wkt(geoms, rounding_precision=-1).tolist()
+
+# WKT for the kinds that can be written straight from their coordinates
+_WKT_TEMPLATES = {'POINT': "POINT ({})", 'LINESTRING': "LINESTRING ({})", 'POLYGON': "POLYGON (({}))"}
+
+# repr() writes integral values as "1.0", the GEOS WKT writer as "1"
+_INTEGRAL_SUFFIX = re.compile(r"\.0(?=[ ,]|$)")
+
+def _fast_wkt(kind, parts) -> List[str]:
+    """
+    Returns the WKT of same-kind geometries formatted directly from their coordinate arrays,
+    without building GEOS objects, or None if the output could differ from Shapely's .wkt.
+    """
+    # Adding zero turns -0.0 into 0.0, GEOS doesn't write the sign of zero
+    points = np.concatenate(parts) + 0.0
+
+    # GEOS writes at most 16 decimals and never an exponent, so repr() only gives the
+    # same digits for zero and 1 <= |v| < 1e16 (lon/lat in degrees nearly always are)
+    magnitude = np.abs(points)
+    if ((magnitude != 0.0) & ((magnitude < 1.0) | (magnitude >= 1e16))).any():
+        return None
+
+    offsets = np.cumsum([0] + [len(part) for part in parts])
+    template = _WKT_TEMPLATES[kind]
+    wkts = []
+    for text in format_coords_ragged(points, offsets):
+        if ".0 " in text or ".0," in text or text.endswith(".0"):
+            text = _INTEGRAL_SUFFIX.sub("", text)
+        wkts.append(template.format(text))
+    return wkts
+
+def geometries_to_wkt(geometries) -> List[str]:
+    """
+    Returns the WKT of each (kind, coords) geometry from dxf_entity_to_wkt, in order.
+    Points, linestrings and polygons are formatted directly where possible, the rest goes through Shapely.
+    """
+    wkts = [None] * len(geometries)
+
+    by_kind = {}
+    for i, (kind, coords) in enumerate(geometries):
+        by_kind.setdefault(kind, []).append(i)
+
+    for kind, positions in by_kind.items():
+        parts = [geometries[i][1] for i in positions]
+        kind_wkts = _fast_wkt(kind, parts) if kind in _WKT_TEMPLATES else None
+        if kind_wkts is None:
+            kind_wkts = _shapely_wkt(kind, parts)
+
+        for i, wkt in zip(positions, kind_wkts):
+            wkts[i] = wkt
+
+    return wkts
+
+def _handle_line(entity, result, transform_point):
+    """LINE - Simple straight line"""
+    start, end = entity.dxf.start, entity.dxf.end
+    points = _transform_array(transform_point, [(start.x, start.y), (end.x, end.y)])
+    (start_x, start_y), (end_x, end_y) = points.tolist()
+
+    result['geometry'] = _geometry('LINESTRING', points)
+    result['extra_data'] = {
+        'start_point': _format_point(start_x, start_y),
+        'end_point': _format_point(end_x, end_y)
+    }
+
+def _handle_lwpolyline(entity, result, transform_point):
+    """LWPOLYLINE - Lightweight polyline"""
+    # The vertices are stored as one flat array of (x, y, start_width, end_width, bulge),
+    # slicing it skips building a Python tuple per point like get_points('xy') does
+    lwpoints = entity.lwpoints
+    points = np.asarray(lwpoints.values, dtype=np.float64).reshape(-1, lwpoints.VERTEX_SIZE)[:, :2]
+    coords = _transform_array(transform_point, points)
+
+    if entity.closed and len(coords) > 2:
+        # Closed polyline becomes a polygon
+        coords = _close_ring(coords)
+        result['geometry'] = _geometry('POLYGON', coords)
+    else:
+        result['geometry'] = _geometry('LINESTRING', coords)
+
+    result['extra_data'] = {
+        'is_closed': entity.closed,
+        'point_count': len(points)
+    }
+
+def _handle_polyline(entity, result, transform_point):
+    """POLYLINE - Old-style polyline"""
+    vertices = _transform_array(transform_point, _vertex_locations(entity.vertices))
+
+    if entity.is_closed and len(vertices) > 2:
+        vertices = _close_ring(vertices)
+        result['geometry'] = _geometry('POLYGON', vertices)
+    else:
+        result['geometry'] = _geometry('LINESTRING', vertices)
+
+    result['extra_data'] = {
+        'is_closed': entity.is_closed,
+        'point_count': len(vertices)
+    }
+
+def _handle_circle(entity, result, transform_point):
+    """CIRCLE - Perfect circle"""
+    center = entity.dxf.center
+    radius = entity.dxf.radius
+
+    # Create points around the circle, 36 points for a good approximation
+    points = _circle_points(_UNIT_CIRCLE, center.x, center.y, radius)
+
+    # Transform the center together with the outline
+    points = _transform_array(transform_point, points)
+    center_lon, center_lat = points[-1].tolist()
+
+    # Close the polygon
+    points[-1] = points[0]
+
+    result['geometry'] = _geometry('POLYGON', points)
+
+    result['extra_data'] = {
+        'center': _format_point(center_lon, center_lat),
+        'radius': radius  # Note: radius is not transformed as it would be distorted
+    }
+
+def _handle_arc(entity, result, transform_point):
+    """ARC - Circular arc"""
+    center = entity.dxf.center
+    radius = entity.dxf.radius
+    start_angle = entity.dxf.start_angle
+    end_angle = entity.dxf.end_angle
+
+    # Handle cases where end_angle < start_angle (crosses 0°)
+    if end_angle < start_angle:
+        end_angle += 360
+
+    # Number of segments depends on arc length
+    angle_span = end_angle - start_angle
+    num_segments = max(int(angle_span / 5), 8)  # At least 8 segments, or one every 5 degrees
+
+    # Create points along the arc
+    points = _arc_points(center.x, center.y, radius, start_angle, angle_span, num_segments)
+
+    # Transform the center together with the arc
+    points = _transform_array(transform_point, points)
+    center_lon, center_lat = points[-1].tolist()
+    points = points[:-1]
+
+    result['geometry'] = _geometry('LINESTRING', points)
+
+    result['extra_data'] = {
+        'center': _format_point(center_lon, center_lat),
+        'radius': radius,
+        'start_angle': start_angle,
+        'end_angle': end_angle
+    }
+
+def _handle_ellipse(entity, result, transform_point):
+    """ELLIPSE - Rotated ellipse"""
+    center = entity.dxf.center
+    major_axis = entity.dxf.major_axis
+    ratio = entity.dxf.ratio  # ratio of minor to major axis
+
+    # Calculate the length of the major axis
+    a = math.sqrt(major_axis.x**2 + major_axis.y**2)
+    # Calculate the length of the minor axis
+    b = a * ratio
+
+    # Calculate the rotation angle of the ellipse
+    rotation = math.atan2(major_axis.y, major_axis.x)
+
+    # Parametric equation of ellipse, 36 points for a good approximation,
+    # rotated and moved to the center
+    points = _ellipse_points(_UNIT_CIRCLE, center.x, center.y, a, b, math.cos(rotation), math.sin(rotation))
+
+    # Transform the center together with the outline
+    points = _transform_array(transform_point, points)
+    center_lon, center_lat = points[-1].tolist()
+
+    # Close the polygon
+    points[-1] = points[0]
+
+    result['geometry'] = _geometry('POLYGON', points)
+
+    result['extra_data'] = {
+        'center': _format_point(center_lon, center_lat),
+        'major_axis': a,
+        'minor_axis': b,
+        'rotation': math.degrees(rotation)
+    }
+
+def _handle_point(entity, result, transform_point):
+    """POINT - Single location"""
+    lon, lat = transform_point(entity.dxf.location.x, entity.dxf.location.y)
+    result['geometry'] = _geometry('POINT', (lon, lat))
+    result['extra_data'] = {
+        'location': _format_point(lon, lat)
+    }
+
+def _handle_spline(entity, result, transform_point):
+    """SPLINE - Approximated by a linestring"""
+    # Get a polyline approximation of the spline
+    points = _xy_points(entity.approximate())
+    transformed_points = _transform_array(transform_point, points)
+    result['geometry'] = _geometry('LINESTRING', transformed_points)
+    result['extra_data'] = {
+        'degree': entity.dxf.degree,
+        'control_point_count': len(entity.control_points)
+    }
+
+def _handle_text(entity, result, transform_point):
+    """TEXT, MTEXT - Text entities"""
+    # For text, we'll just use the insertion point
+    if result['type'] == 'TEXT':
+        lon, lat = transform_point(entity.dxf.insert.x, entity.dxf.insert.y)
+        text_content = entity.dxf.text
+    else:  # MTEXT
+        lon, lat = transform_point(entity.dxf.insert.x, entity.dxf.insert.y)
+        text_content = entity.text
+
+    result['geometry'] = _geometry('POINT', (lon, lat))
+    result['extra_data'] = {
+        'location': _format_point(lon, lat),
+        'text': text_content
+    }
+
+def _handle_face(entity, result, transform_point):
+    """3DFACE, SOLID, TRACE - Filled areas"""
+    vertices = entity.vertices()
+    points = _transform_array(transform_point, _xy_points(vertices))
+
+    # Ensure the polygon is closed
+    result['geometry'] = _geometry('POLYGON', _close_ring(points))
+    result['extra_data'] = {
+        'vertex_count': len(vertices)
+    }
+
+def _handle_hatch(entity, result, transform_point):
+    """HATCH - Filled area defined by boundaries"""
+    # Get all external paths
+    paths = []
+    for path in entity.paths:
+        # Polyline paths hold (x, y, bulge) vertices
+        if hasattr(path, 'vertices') and path.vertices:
+            vertices = np.asarray(path.vertices, dtype=np.float64)[:, :2]
+            paths.append(_close_ring(_transform_array(transform_point, vertices)))
+
+    # Create a MultiPolygon if multiple paths exist
+    if len(paths) > 1:
+        result['geometry'] = ('MULTIPOLYGON', [_geometry('POLYGON', path)[1] for path in paths])
+    elif len(paths) == 1:
+        result['geometry'] = _geometry('POLYGON', paths[0])
+
+    result['extra_data'] = {
+        'pattern': entity.dxf.pattern_name,
+        'path_count': len(paths)
+    }
+
+# DXF types that share a converter
+_TEXT_TYPES = frozenset({'TEXT', 'MTEXT'})
+_FILLED_TYPES = frozenset({'3DFACE', 'SOLID', 'TRACE'})
+
+# Converters per DXF type, a single dict lookup per entity instead of an if/elif chain
+_HANDLERS = {
+    'LINE': _handle_line,
+    'LWPOLYLINE': _handle_lwpolyline,
+    'POLYLINE': _handle_polyline,
+    'CIRCLE': _handle_circle,
+    'ARC': _handle_arc,
+    'ELLIPSE': _handle_ellipse,
+    'POINT': _handle_point,
+    'SPLINE': _handle_spline,
+    'HATCH': _handle_hatch,
+    **dict.fromkeys(_TEXT_TYPES, _handle_text),
+    **dict.fromkeys(_FILLED_TYPES, _handle_face),
+}
+
+def dxf_entity_to_wkt(entity, transform=None):
+    """
+    Convert a DXF entity to coordinates with metadata, the geometry is returned as
+    (kind, coords) and turned into WKT in bulk by geometries_to_wkt.
+
+    transform is a Transformer.transform style callable, e.g.
+    get_transformer("EPSG:28992", "EPSG:4326").transform. None keeps the DXF coordinates.
+    """
+    transform_point = transform or _no_transform
     
+    # Looked up once per entity rather than once per field
     entity_type = entity.dxftype()
+    dxf = entity.dxf
 
     result = {
-        'layer': entity.dxf.layer,
+        'layer': dxf.layer,
         'type': entity_type,
-        'color': entity.dxf.color if hasattr(entity.dxf, 'color') else 0,
-        'wkt': None,
+        'color': dxf.color if hasattr(dxf, 'color') else 0,
+        'geometry': None,
         'extra_data': {}
     }
 
-    # LINE - Simple straight line
-    if entity_type == 'LINE':
-        start_x, start_y = transform_point(entity.dxf.start.x, entity.dxf.start.y)
-        end_x, end_y = transform_point(entity.dxf.end.x, entity.dxf.end.y)
-        
-        line = sg.LineString([(start_x, start_y), (end_x, end_y)])
-        result['wkt'] = line.wkt
-        result['extra_data'] = {
-            'start_point': f"{start_x},{start_y}",
-            'end_point': f"{end_x},{end_y}"
-        }
-    
-    # LWPOLYLINE - Lightweight polyline
-    elif entity_type == 'LWPOLYLINE':
-        points = entity.get_points()
-        coords = [transform_point(p[0], p[1]) for p in points]
-        
-        if entity.closed and len(coords) > 2:
-            # Closed polyline becomes a polygon
-            if coords[0] != coords[-1]:
-                coords.append(coords[0])
-            polygon = sg.Polygon(coords)
-            result['wkt'] = polygon.wkt
-        else:
-            linestring = sg.LineString(coords)
-            result['wkt'] = linestring.wkt
-        
-        result['extra_data'] = {
-            'is_closed': entity.closed,
-            'point_count': len(points)
-        }
-
-    # POLYLINE - Old-style polyline
-    elif entity_type == 'POLYLINE':
-        vertices = [transform_point(v.dxf.location.x, v.dxf.location.y) for v in entity.vertices]
-        
-        if entity.is_closed and len(vertices) > 2:
-            if vertices[0] != vertices[-1]:
-                vertices.append(vertices[0])
-            polygon = sg.Polygon(vertices)
-            result['wkt'] = polygon.wkt
-        else:
-            linestring = sg.LineString(vertices)
-            result['wkt'] = linestring.wkt
-            
-        result['extra_data'] = {
-            'is_closed': entity.is_closed,
-            'point_count': len(vertices)
-        }
-        
-    # CIRCLE - Perfect circle
-    elif entity_type == 'CIRCLE':
-        center = entity.dxf.center
-        radius = entity.dxf.radius
-        
-        # Create points around the circle
-        points = []
-        for i in range(36):  # 36 points for a good approximation
-            angle = math.radians(i * 10)
-            x = center.x + radius * math.cos(angle)
-            y = center.y + radius * math.sin(angle)
-            lon, lat = transform_point(x, y)
-            points.append((lon, lat))
-        
-        # Close the polygon
-        points.append(points[0])
-        
-        polygon = sg.Polygon(points)
-        result['wkt'] = polygon.wkt
-        
-        center_lon, center_lat = transform_point(center.x, center.y)
-        result['extra_data'] = {
-            'center': f"{center_lon},{center_lat}",
-            'radius': radius  # Note: radius is not transformed as it would be distorted
-        }
-    
-    # ARC - Circular arc
-    elif entity_type == 'ARC':
-        center = entity.dxf.center
-        radius = entity.dxf.radius
-        start_angle = entity.dxf.start_angle
-        end_angle = entity.dxf.end_angle
-        
-        # Create points along the arc
-        points = []
-        # Handle cases where end_angle < start_angle (crosses 0°)
-        if end_angle < start_angle:
-            end_angle += 360
-        
-        # Number of segments depends on arc length
-        angle_span = end_angle - start_angle
-        num_segments = max(int(angle_span / 5), 8)  # At least 8 segments, or one every 5 degrees
-        
-        for i in range(num_segments + 1):
-            angle = math.radians(start_angle + (angle_span * i / num_segments))
-            x = center.x + radius * math.cos(angle)
-            y = center.y + radius * math.sin(angle)
-            lon, lat = transform_point(x, y)
-            points.append((lon, lat))
-        
-        linestring = sg.LineString(points)
-        result['wkt'] = linestring.wkt
-        
-        center_lon, center_lat = transform_point(center.x, center.y)
-        result['extra_data'] = {
-            'center': f"{center_lon},{center_lat}",
-            'radius': radius,
-            'start_angle': start_angle,
-            'end_angle': end_angle
-        }
-    
-    # ELLIPSE
-    elif entity_type == 'ELLIPSE':
-        center = entity.dxf.center
-        major_axis = entity.dxf.major_axis
-        ratio = entity.dxf.ratio  # ratio of minor to major axis
-        
-        # Calculate the length of the major axis
-        a = math.sqrt(major_axis.x**2 + major_axis.y**2)
-        # Calculate the length of the minor axis
-        b = a * ratio
-        
-        # Calculate the rotation angle of the ellipse
-        rotation = math.atan2(major_axis.y, major_axis.x)
-        
-        # Generate points around the ellipse
-        points = []
-        for i in range(36):  # 36 points for a good approximation
-            angle = i * 10  # in degrees
-            angle_rad = math.radians(angle)
-            
-            # Parametric equation of ellipse
-            x = a * math.cos(angle_rad)
-            y = b * math.sin(angle_rad)
-            
-            # Rotate point
-            x_rot = center.x + x * math.cos(rotation) - y * math.sin(rotation)
-            y_rot = center.y + x * math.sin(rotation) + y * math.cos(rotation)
-            
-            lon, lat = transform_point(x_rot, y_rot)
-            points.append((lon, lat))
-        
-        # Close the polygon
-        points.append(points[0])
-        
-        polygon = sg.Polygon(points)
-        result['wkt'] = polygon.wkt
-        
-        center_lon, center_lat = transform_point(center.x, center.y)
-        result['extra_data'] = {
-            'center': f"{center_lon},{center_lat}",
-            'major_axis': a,
-            'minor_axis': b,
-            'rotation': math.degrees(rotation)
-        }
-    
-    # POINT
-    elif entity_type == 'POINT':
-        lon, lat = transform_point(entity.dxf.location.x, entity.dxf.location.y)
-        point = sg.Point(lon, lat)
-        result['wkt'] = point.wkt
-        result['extra_data'] = {
-            'location': f"{lon},{lat}"
-        }
-    
-    # SPLINE
-    elif entity_type == 'SPLINE':
-        # Get a polyline approximation of the spline
-        points = [(p.x, p.y) for p in entity.approximate()]
-        transformed_points = [transform_point(x, y) for x, y in points]
-        linestring = sg.LineString(transformed_points)
-        result['wkt'] = linestring.wkt
-        result['extra_data'] = {
-            'degree': entity.dxf.degree,
-            'control_point_count': len(entity.control_points)
-        }
-    
-    # TEXT, MTEXT - Text entities
-    elif entity_type in ('TEXT', 'MTEXT'):
-        # For text, we'll just use the insertion point
-        if entity_type == 'TEXT':
-            lon, lat = transform_point(entity.dxf.insert.x, entity.dxf.insert.y)
-            text_content = entity.dxf.text
-        else:  # MTEXT
-            lon, lat = transform_point(entity.dxf.insert.x, entity.dxf.insert.y)
-            text_content = entity.text
-            
-        point = sg.Point(lon, lat)
-        result['wkt'] = point.wkt
-        result['extra_data'] = {
-            'location': f"{lon},{lat}",
-            'text': text_content
-        }
-    
-    # 3DFACE, SOLID, TRACE - Filled areas
-    elif entity_type in ('3DFACE', 'SOLID', 'TRACE'):
-        vertices = entity.vertices()
-        points = [transform_point(v.x, v.y) for v in vertices]
-        
-        # Ensure the polygon is closed
-        if points[0] != points[-1]:
-            points.append(points[0])
-            
-        polygon = sg.Polygon(points)
-        result['wkt'] = polygon.wkt
-        result['extra_data'] = {
-            'vertex_count': len(vertices)
-        }
-    
-    # HATCH - Filled area defined by boundaries
-    elif entity_type == 'HATCH':
-        # Get all external paths
-        paths = []
-        for path in entity.paths:
-            if hasattr(path, 'vertices'):
-                vertices = [transform_point(v.x, v.y) for v in path.vertices]
-                if vertices:
-                    paths.append(vertices)
-        
-        # Create a MultiPolygon if multiple paths exist
-        if len(paths) > 1:
-            polygons = []
-            for path in paths:
-                if path[0] != path[-1]:
-                    path.append(path[0])
-                polygons.append(sg.Polygon(path))
-            multi_polygon = sg.MultiPolygon(polygons)
-            result['wkt'] = multi_polygon.wkt
-        elif len(paths) == 1:
-            path = paths[0]
-            if path[0] != path[-1]:
-                path.append(path[0])
-            polygon = sg.Polygon(path)
-            result['wkt'] = polygon.wkt
-            
-        result['extra_data'] = {
-            'pattern': entity.dxf.pattern_name,
-            'path_count': len(paths)
-        }
-
-    return result
\ No newline at end of file
+    handler = _HANDLERS.get(entity_type)
+    if handler:
+        handler(entity, result, transform_point)
+
+    return result